@@ -1,12 +1,17 @@
 # coding=utf-8
 import itertools
 import time
-from collections import deque
 from collections import namedtuple
-from random import sample
+try:
+    from collections.abc import Set
+except ImportError:  # Python 2.7
+    from collections import Set
+from random import randrange, sample
 
 from minesweeper.game import State, BoardGameState
 
+_NEIGHBOUR_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
 
 class MineSweeper(object):
     DIFFICULTY_STEP = 0.025
@@ -69,11 +74,15 @@ class MineSweeper(object):
         self._board.reset()
 
     def update(self, command):
+        # NONE carries no position, so it must not start the game either.
+        if command is None or command.type == CmdType.NONE:
+            return
+
         if self._state & State.STARTING and not command.type & CmdType.MOVE:
             self._start(command.pos)
             return
 
-        if command is None or command.type == CmdType.NONE or self.game_over:
+        if self.game_over:
             return
 
         self._handle_movement(command)
@@ -100,17 +109,10 @@ class MineSweeper(object):
         self.message += Strings.TIMER % total_time
 
     def _handle_movement(self, command):
-        new_cursor_pos = list(command.pos)
-        if command.type & CmdType.DOWN:
-            new_cursor_pos[1] += 1
-        if command.type & CmdType.LEFT:
-            new_cursor_pos[0] -= 1
-        if command.type & CmdType.RIGHT:
-            new_cursor_pos[0] += 1
-        if command.type & CmdType.UP:
-            new_cursor_pos[1] -= 1
-
-        self._cursor_pos = tuple(self._board.clamp_pos(new_cursor_pos))
+        # Other commands still move the cursor to their position.
+        dx, dy = _CURSOR_DELTAS.get(command.type & CmdType.MOVE, (0, 0))
+        x, y = command.pos
+        self._cursor_pos = self._board.clamp_pos(x + dx, y + dy)
 
     def _handle_reveal(self, command):
         if not command.type & CmdType.REVEAL:
@@ -172,12 +174,28 @@ class BoardState(object):
         self._width = width
         self._height = height
         self._num_mines = max(1, int((width * height - 1) * density))  # At least 1 mine.
+        # Board geometry never changes, so look up each cell's neighbours once.
+        self._neighbours = [tuple((x + dx, y + dy) for dx, dy in _NEIGHBOUR_OFFSETS
+                                  if 0 <= x + dx < width and 0 <= y + dy < height)
+                            for y in range(height) for x in range(width)]
+        self._neighbour_indices = [tuple(ny * width + nx for nx, ny in neighbours)
+                                   for neighbours in self._neighbours]
+        # Refilled by reset() rather than replaced, so views handed out stay live across games.
+        self._hidden = set()
+        self._hidden_view = _SetView(self._hidden)
         self.reset()
 
     def reset(self):
         self._mines = None
+        self._adj_counts = None
         self._num_hidden = self.width * self.height
-        self._rows = [[self.HIDDEN for _ in range(self._width)] for _ in range(self._height)]
+        # Every cell state fits in a byte, so keep the board in one flat buffer of rows.
+        self._buf = bytearray([self.HIDDEN]) * (self._width * self._height)
+        self._hidden.clear()
+        self._hidden.update(itertools.product(range(self._width), range(self._height)))
+        # Per-cell counts of hidden and flagged neighbours, kept in step with every state change.
+        self._hidden_neighbour_counts = bytearray(len(n) for n in self._neighbour_indices)
+        self._flagged_neighbour_counts = bytearray(self._width * self._height)
 
     @property
     def width(self):
@@ -195,6 +213,12 @@ class BoardState(object):
     def num_hidden(self):
         return self._num_hidden
 
+    @property
+    def hidden_cells(self):
+        # Read-only live view, so it tracks the board without copying. Excludes flagged cells,
+        # unlike num_hidden.
+        return self._hidden_view
+
     def is_in_bounds(self, x, y):
         return 0 <= x < self._width and 0 <= y < self._height
 
@@ -203,78 +227,162 @@ class BoardState(object):
             self.set(*mine, value=self.MINE)
 
     def reveal_from(self, x, y):
-        visited = set()
-        to_visit = deque()
-        to_visit.append((x, y))
+        if not self.is_in_bounds(x, y):
+            return
 
-        def should_visit(x, y):
-            return self.is_in_bounds(x, y) and \
-                   (x, y) not in visited and \
-                   self.get(x, y) & (self.HIDDEN | self.FLAG)
+        width = self._width
+        revealed = _flood_fill(self._buf, self._adj_counts, self._neighbour_indices,
+                               self._hidden_neighbour_counts, self._flagged_neighbour_counts,
+                               y * width + x, self.HIDDEN, self.FLAG, self.EMPTY)
+        for i in revealed:
+            self._hidden.discard((i % width, i // width))
+        self._num_hidden -= len(revealed)
 
-        def fill(x, y):
-            if not should_visit(x, y):
-                return
+    def set(self, x, y, value):
+        if not self.is_in_bounds(x, y):
+            return
 
-            visited.add((x, y))
+        i = y * self._width + x
+        old_value = self._buf[i]
+        self._buf[i] = value
+        if value == old_value:
+            return
 
-            num_adjacent_mines = self._count_adjacent_mines(x, y)
-            if num_adjacent_mines > 0:
-                self._rows[y][x] = num_adjacent_mines
-            else:
-                self._rows[y][x] = self.EMPTY
-                for pos in self._adjacent_pos(x, y):
-                    to_visit.append(pos)
+        if value == self.HIDDEN:
+            self._hidden.add((x, y))
+        else:
+            self._hidden.discard((x, y))
+        self._update_neighbour_counts(i, old_value, -1)
+        self._update_neighbour_counts(i, value, 1)
 
-        while len(to_visit) > 0:
-            fill(*to_visit.pop())
+    def count_hidden_neighbours(self, x, y):
+        return self._hidden_neighbour_counts[y * self._width + x]
 
-        self._num_hidden -= len(visited)
+    def count_flagged_neighbours(self, x, y):
+        return self._flagged_neighbour_counts[y * self._width + x]
 
-    def set(self, x, y, value):
-        if self.is_in_bounds(x, y):
-            self._rows[y][x] = value
+    def _update_neighbour_counts(self, i, state, delta):
+        if state == self.HIDDEN:
+            counts = self._hidden_neighbour_counts
+        elif state == self.FLAG:
+            counts = self._flagged_neighbour_counts
+        else:
+            return
+        for n in self._neighbour_indices[i]:
+            counts[n] += delta
 
     def get(self, x, y):
-        return self._rows[y][x] if self.is_in_bounds(x, y) else None
+        return self._buf[y * self._width + x] if self.is_in_bounds(x, y) else None
 
-    def clamp_pos(self, pos):
-        return (min(self._width - 1, max(pos[0], 0)),
-                min(self._height - 1, max(pos[1], 0)))
+    def clamp_pos(self, x, y):
+        return (min(self._width - 1, max(x, 0)),
+                min(self._height - 1, max(y, 0)))
 
     def _adjacent_pos(self, x, y):
-        return set(itertools.product([x - 1, x, x + 1], [y - 1, y, y + 1]))
+        return self._neighbours[y * self._width + x]
 
     def create_mines(self, exclude_pos=None):
-        possible_positions = list(itertools.product(range(self._width), range(self._height)))
-        if exclude_pos is not None:
-            possible_positions.remove(exclude_pos)
-        self._mines = sample(possible_positions, self._num_mines)
-
-    def _count_adjacent_mines(self, x, y):
-        return len(self._adjacent_pos(x, y).intersection(self._mines))
+        if self._num_mines * 3 < self._width * self._height:
+            # Sparse boards rarely draw a taken position, so skip listing every cell.
+            mines = set()
+            while len(mines) < self._num_mines:
+                pos = (randrange(self._width), randrange(self._height))
+                if pos != exclude_pos:
+                    mines.add(pos)
+        else:
+            possible_positions = list(itertools.product(range(self._width), range(self._height)))
+            if exclude_pos is not None:
+                possible_positions.remove(exclude_pos)
+            mines = set(sample(possible_positions, self._num_mines))
+        self._set_mines(mines)
+
+    def _set_mines(self, mines):
+        self._mines = frozenset(mines)
+
+        # Mines don't move during a game, so count them once instead of on every reveal.
+        self._adj_counts = bytearray(self._width * self._height)
+        for mx, my in self._mines:
+            for i in self._neighbour_indices[my * self._width + mx]:
+                self._adj_counts[i] += 1
+
+    def iter_cells(self):
+        # Same as __iter__ but yields plain tuples, which are cheaper to build than Cell.
+        width = self._width
+        return ((i % width, i // width, state) for i, state in enumerate(self._buf))
 
     def __iter__(self):
-        return (self.Cell(x, y, self._rows[y][x])
-                for y in range(len(self._rows))
-                for x in range(len(self._rows[0])))
+        width = self._width
+        return (self.Cell(i % width, i // width, state) for i, state in enumerate(self._buf))
 
     def __getitem__(self, row):
-        return self._rows[row]
+        return self._buf[row * self._width:(row + 1) * self._width]
 
     def __len__(self):
-        return len(self._rows)
+        return self._height
 
     def __repr__(self):
-        return '[%s]' % (',\n '.join(str(row) for row in self._rows))
+        return '[%s]' % (',\n '.join(str(list(self[row])) for row in range(self._height)))
 
     def __eq__(self, other):
-        return all(other.get(x, y) == state for x, y, state in self)
+        return all(other.get(x, y) == state for x, y, state in self.iter_cells())
 
     def __neq__(self, other):
         return not self == other
 
 
+class _SetView(Set):
+    '''
+    Read-only view of a set that is still being updated by its owner.
+    '''
+    def __init__(self, items):
+        self._items = items
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+
+def _flood_fill(buf, adj_counts, neighbour_indices, hidden_neighbour_counts,
+                flagged_neighbour_counts, start, hidden, flag, empty):
+    '''
+    Reveals cells outwards from start over flat cell indices, keeping the neighbour counts
+    in step while each cell's neighbours are being walked anyway.
+    :return: Indices of the revealed cells.
+    '''
+    can_reveal = hidden | flag
+    visited = bytearray(len(buf))
+    revealed = []
+    to_visit = [start]
+
+    while to_visit:
+        i = to_visit.pop()
+        if visited[i] or not buf[i] & can_reveal:
+            continue
+
+        visited[i] = 1
+        revealed.append(i)
+        counts = flagged_neighbour_counts if buf[i] == flag else hidden_neighbour_counts
+
+        num_adjacent_mines = adj_counts[i]
+        if num_adjacent_mines > 0:
+            buf[i] = num_adjacent_mines
+            for n in neighbour_indices[i]:
+                counts[n] -= 1
+        else:
+            buf[i] = empty
+            for n in neighbour_indices[i]:
+                counts[n] -= 1
+                if not visited[n]:
+                    to_visit.append(n)
+
+    return revealed
+
+
 class Command(namedtuple('Command', ['type', 'x', 'y'])):
     @property
     def pos(self):
@@ -295,27 +403,16 @@ class CmdType(object):
     MOVE = LEFT | RIGHT | UP | DOWN
 
 
-def map_cell_state_to_renderable(cell):
-    if cell == BoardState.HIDDEN:
-        return Strings.HIDDEN_CELL
-
-    if cell == BoardState.MINE:
-        return Strings.MINE_CELL
-
-    if cell == BoardState.FLAG:
-        return Strings.FLAG_CELL
+_CURSOR_DELTAS = {
+    CmdType.LEFT: (-1, 0),
+    CmdType.RIGHT: (1, 0),
+    CmdType.UP: (0, -1),
+    CmdType.DOWN: (0, 1),
+}
 
-    if cell == BoardState.EMPTY:
-        return Strings.EMPTY_CELL
 
-    try:
-        if 0 < int(cell) <= 8:
-            return str(cell)
-    except ValueError:
-        # Invalid cell state.
-        pass
-
-    return Strings.INVALID_CELL
+def map_cell_state_to_renderable(cell):
+    return _CELL_RENDERABLES.get(cell, Strings.INVALID_CELL)
 
 
 class Strings(object):
@@ -331,3 +428,12 @@ class Strings(object):
     FLAG_CELL = u'[bold]†'
     EMPTY_CELL = u' '
     INVALID_CELL = u'?'
+
+
+_CELL_RENDERABLES = {
+    BoardState.HIDDEN: Strings.HIDDEN_CELL,
+    BoardState.MINE: Strings.MINE_CELL,
+    BoardState.FLAG: Strings.FLAG_CELL,
+    BoardState.EMPTY: Strings.EMPTY_CELL,
+}
+_CELL_RENDERABLES.update((count, str(count)) for count in range(1, 9))
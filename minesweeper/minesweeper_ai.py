@@ -1,7 +1,7 @@
 from collections import namedtuple
 import time
 
-from minesweeper.minesweeper import Command, CmdType, BoardState
+from minesweeper.minesweeper import Command, CmdType
 
 
 class MineSweeperAI(object):
@@ -17,7 +17,7 @@ class MineSweeperAI(object):
 
     def __init__(self, game):
         self._game = game
-        self._cache = {}
+        self._prob_cache = {}
 
     def __iter__(self):
         return self
@@ -39,48 +39,56 @@ class MineSweeperAI(object):
     __next__ = next
 
     def _moves(self, cells):
+        # Same for every cell this turn, so compute it once.
+        general_prob = float(self._game.board.num_mines - self._game.num_flags) / \
+                       float(self._game.board.num_hidden - self._game.num_flags)
         for x, y in cells:
-            risk = self._calc_risk(x, y)
+            risk = self._calc_risk(x, y, general_prob)
             yield risk
-            if risk == self._MIN_RISK or risk == self._MAX_RISK:
+            if risk.risk <= self._MIN_RISK or risk.risk >= self._MAX_RISK:
                 # Found candidate move, so we can stop.
                 return
 
     def _find_best_moves(self):
-        hidden_cells = [(x, y) for x, y, state in self._game.board if state == BoardState.HIDDEN]
-        risks = sorted(self._moves(hidden_cells), key=lambda r: r.risk)
-        best_reveal = risks[0]
-        best_flag = risks[-1]
+        best_reveal = best_flag = None
+        for risk in self._moves(self._game.board.hidden_cells):
+            if best_reveal is None or risk.risk < best_reveal.risk:
+                best_reveal = risk
+            if best_flag is None or risk.risk > best_flag.risk:
+                best_flag = risk
         return best_flag, best_reveal
 
-    def _calc_risk(self, x, y):
+    def _calc_risk(self, x, y, general_prob):
         if self._is_definite_safe(x, y):
             return self.CellRisk(self._MIN_RISK, x, y)
 
         if self._is_definite_mine(x, y):
             return self.CellRisk(self._MAX_RISK, x, y)
 
-        general_prob = float(self._game.board.num_mines - self._game.num_flags) / \
-                       float(self._game.board.num_hidden - self._game.num_flags)
-
-        def prob_mine(ax, ay):
-            val = self._game.board.get(ax, ay)
-            if val is None:
-                # Prefer edges since they have a better chance of revealing more cells.
-                return general_prob / 2.0
-            if val > self._NUM_NEIGHBOURS:
-                # No extra information from this cell.
-                return general_prob
-
-            # Use number of expected versus found mines to estimate likelihood.
-            hidden = self._count_neighbours_state(ax, ay, BoardState.HIDDEN)
-            flags = self._count_neighbours_state(ax, ay, BoardState.FLAG)
-            return float(val - flags) / float(hidden)
-
         # Calculating actual probability takes exponential time.
         # Let's average probabilities to get a rough estimate of risk.
-        probabilities = [prob_mine(ax, ay) for ax, ay in self._game.board._adjacent_pos(x, y)]
-        return self.CellRisk(sum(probabilities) / len(probabilities), x, y)
+        probabilities = [self._prob_mine(ax, ay, general_prob)
+                         for ax, ay in self._game.board._adjacent_pos(x, y)]
+        # Prefer edges since they have a better chance of revealing more cells.
+        num_off_board = self._NUM_NEIGHBOURS - len(probabilities)
+        return self.CellRisk((sum(probabilities) + num_off_board * general_prob / 2.0) /
+                             self._NUM_NEIGHBOURS, x, y)
+
+    def _prob_mine(self, x, y, general_prob):
+        # Shared by up to 8 hidden neighbours per turn, so compute each cell once.
+        prob = self._prob_cache.get((x, y))
+        if prob is None:
+            val = self._game.board.get(x, y)
+            if val > self._NUM_NEIGHBOURS:
+                # No extra information from this cell.
+                prob = general_prob
+            else:
+                # Use number of expected versus found mines to estimate likelihood.
+                hidden = self._game.board.count_hidden_neighbours(x, y)
+                flags = self._game.board.count_flagged_neighbours(x, y)
+                prob = float(val - flags) / float(hidden)
+            self._prob_cache[(x, y)] = prob
+        return prob
 
     def _handle_game_over(self):
         time.sleep(self.GAME_OVER_DELAY)
@@ -89,43 +97,31 @@ class MineSweeperAI(object):
         else:
             return Command(CmdType.NONE, 0, 0)
 
-    def _count_neighbours_state(self, x, y, state):
-        if not self._in_cache('count', (x, y, state)):
-            self._set_cache('count', (x, y, state),
-                            sum(1 for ax, ay in self._game.board._adjacent_pos(x, y) \
-                                if self._game.board.get(ax, ay) == state))
-        return self._get_cache('count', (x, y, state))
-
     def _get_neighbour_values(self, x, y):
         return [self._game.board.get(ax, ay) for ax, ay in self._game.board._adjacent_pos(x, y)]
 
     def _is_definite_safe(self, x, y):
-        return any(self._count_neighbours_state(ax, ay, BoardState.FLAG) == \
-                   self._game.board.get(ax, ay) for ax, ay in self._game.board._adjacent_pos(x, y))
+        board = self._game.board
+        for ax, ay in board._adjacent_pos(x, y):
+            state = board.get(ax, ay)
+            # Only revealed neighbours carry information.
+            if state <= self._NUM_NEIGHBOURS and \
+                    board.count_flagged_neighbours(ax, ay) == state:
+                return True
+        return False
 
     def _is_definite_mine(self, x, y):
-        neighbours = self._game.board._adjacent_pos(x, y)
-        for n in neighbours:
-            num_flagged_neighbours_of_n = self._count_neighbours_state(*n, state=BoardState.FLAG)
-            num_hidden_neighbours_of_n = self._count_neighbours_state(*n, state=BoardState.HIDDEN)
-
-            state = self._game.board.get(*n)
-            if state is None:
+        board = self._game.board
+        for ax, ay in board._adjacent_pos(x, y):
+            state = board.get(ax, ay)
+            if state > self._NUM_NEIGHBOURS:
                 continue
 
-            if state <= self._NUM_NEIGHBOURS and num_hidden_neighbours_of_n <= \
-                                                 state - num_flagged_neighbours_of_n:
+            num_flagged_neighbours = board.count_flagged_neighbours(ax, ay)
+            num_hidden_neighbours = board.count_hidden_neighbours(ax, ay)
+            if num_hidden_neighbours <= state - num_flagged_neighbours:
                 return True
         return False
 
-    def _set_cache(self, method, params, value):
-        self._cache[(method, params)] = value
-
-    def _in_cache(self, method, params):
-        return (method, params) in self._cache
-
-    def _get_cache(self, method, params):
-        return self._cache[(method, params)]
-
     def _clear_cache(self):
-        self._cache = {}
+        self._prob_cache = {}
@@ -30,20 +30,25 @@ class CmdKey(object):
     }
 
 
+# Position is ignored for NONE, so every unmapped key can share one instance.
+_NONE_COMMAND = Command(CmdType.NONE, 0, 0)
+
+
 def map_key_to_command(key_code, x, y):
     if key_code == CmdKey.QUIT_KEY:
         raise StopIteration()
 
-    if key_code in CmdKey.MOVEMENT_KEYS:
-        return Command(CmdKey.MOVEMENT_KEYS[key_code], x, y)
-
     if key_code == CmdKey.REVEAL_KEY:
         return Command(CmdType.REVEAL, x, y)
 
     if key_code == CmdKey.TOGGLE_FLAG_KEY:
         return Command(CmdType.TOGGLE_FLAG, x, y)
 
-    return Command(CmdType.NONE, x, y)
+    movement = CmdKey.MOVEMENT_KEYS.get(key_code)
+    if movement is not None:
+        return Command(movement, x, y)
+
+    return _NONE_COMMAND
 
 
 
@@ -56,7 +56,7 @@ class GameBoardRenderer(object):
         if not self._is_valid_board_state(board_state):
             raise ValueError('Invalid _rows state: %s' % board_state)
 
-        for x, y, state in board_state:
+        for x, y, state in board_state.iter_cells():
             self._put_on_board(x, y, map_cell_to_renderable(state))
 
         self._game_window.move(cursor_pos[1] + self.BORDER_WIDTH,
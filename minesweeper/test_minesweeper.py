@@ -1,8 +1,10 @@
+import itertools
 from unittest import TestCase
 
 from minesweeper.game import State
 from minesweeper.minesweeper import (MineSweeper, BoardState, Command, map_cell_state_to_renderable,
                          CmdType, Strings)
+from minesweeper.minesweeper_ai import MineSweeperAI
 from minesweeper.minesweeper_cli import map_key_to_command, CmdKey
 
 
@@ -66,6 +68,10 @@ class TestMineSweeper(TestCase):
         self.assertEquals(((0, 1), State.STARTING),
                           (self.ms.cursor_pos, self.ms.game_state.state))
 
+    def test_update_none_command_before_start_does_not_start_game(self):
+        self.ms.update(Command(CmdType.NONE, 0, 0))
+        self.assertEquals(State.STARTING, self.ms.game_state.state)
+
     def test_update_start_and_down_command_moves_cursor_down(self):
         self.ms._start()
         self.ms.update(Command(CmdType.DOWN, 0, 0))
@@ -76,6 +82,16 @@ class TestMineSweeper(TestCase):
         self.ms.update(Command(CmdType.RIGHT, 0, 0))
         self.assertEquals((1, 0), self.ms.cursor_pos)
 
+    def test_update_start_and_up_command_at_top_edge_stays_on_board(self):
+        self.ms._start()
+        self.ms.update(Command(CmdType.UP, 2, 0))
+        self.assertEquals((2, 0), self.ms.cursor_pos)
+
+    def test_update_start_and_reveal_command_moves_cursor_to_command_pos(self):
+        self.ms._start()
+        self.ms.update(Command(CmdType.REVEAL, 2, 3))
+        self.assertEquals((2, 3), self.ms.cursor_pos)
+
     def test_update_start_and_flag_command_flags_cell(self):
         self.ms._start()
         self.ms.update(Command(CmdType.TOGGLE_FLAG, 0, 0))
@@ -174,30 +190,83 @@ class TestBoardState(TestCase):
 
     def test_reveal_from_adjacent_to_mine_reveals_one_cell(self):
         bs = self._create_boardstate(3, 3, 0)
-        bs._mines = [(0, 0)]  # Single mine at origin
+        bs._set_mines([(0, 0)])  # Single mine at origin
         bs.reveal_from(1, 1)
         self.assertEquals([[32, 32, 32],
                            [32, 1, 32],
                            [32, 32, 32]],
-                          bs._rows)
+                          [list(bs[row]) for row in range(len(bs))])
 
     def test_reveal_from_away_from_mine_reveals_all_but_mine(self):
         bs = self._create_boardstate(3, 3, 0)
-        bs._mines = [(0, 0)]  # Single mine at origin
+        bs._set_mines([(0, 0)])  # Single mine at origin
         bs.reveal_from(2, 2)
         self.assertEquals([[32, 1, 0],
                            [1, 1, 0],
                            [0, 0, 0]],
-                          bs._rows)
+                          [list(bs[row]) for row in range(len(bs))])
 
     def test_reveal_from_away_and_partially_blocked_reveals_half_board(self):
         bs = self._create_boardstate(3, 4, 0)
-        bs._mines = [(1, 0), (1, 1)]  # Two mines down middle
+        bs._set_mines([(1, 0), (1, 1)])  # Two mines down middle
         bs.reveal_from(3, 1)
         self.assertEquals([[32, 32, 2, 0],
                            [32, 32, 2, 0],
                            [32, 32, 1, 0]],
-                          bs._rows)
+                          [list(bs[row]) for row in range(len(bs))])
+
+    def test_create_mines_excluded_pos_has_no_mine(self):
+        for density in (0.125, 1):
+            bs = self._create_boardstate(4, 4, density)
+            bs.create_mines(exclude_pos=(1, 2))
+            self.assertEquals((bs.num_mines, False), (len(bs._mines), (1, 2) in bs._mines))
+
+    def test_set_mines_counts_adjacent_mines(self):
+        bs = self._create_boardstate(3, 3, 0)
+        bs._set_mines([(0, 0), (2, 0)])  # Mines in top corners
+        self.assertEquals([0, 2, 0,
+                           1, 2, 1,
+                           0, 0, 0],
+                          list(bs._adj_counts))
+
+    def test_hidden_cells_after_reveal_and_flag_excludes_both(self):
+        bs = self._create_boardstate(3, 3, 0)
+        bs._set_mines([(0, 0)])  # Single mine at origin
+        bs.set(1, 0, BoardState.FLAG)
+        bs.reveal_from(1, 1)
+        self.assertEquals(set(itertools.product(range(3), range(3))) - {(1, 0), (1, 1)},
+                          bs.hidden_cells)
+
+    def test_iter_cells_matches_iter(self):
+        bs = self._create_boardstate(3, 4)
+        bs.set(2, 1, BoardState.FLAG)
+        self.assertEquals([tuple(cell) for cell in bs], list(bs.iter_cells()))
+
+    def test_count_neighbours_after_flag_and_reveal_matches_board(self):
+        bs = self._create_boardstate(3, 4, 0)
+        bs._set_mines([(1, 0), (1, 1)])  # Two mines down middle
+        bs.set(0, 2, BoardState.FLAG)
+        bs.set(3, 2, BoardState.FLAG)  # Flag inside the region revealed below
+        bs.reveal_from(3, 1)
+        for x, y, _ in bs.iter_cells():
+            neighbours = [bs.get(ax, ay) for ax, ay in bs._adjacent_pos(x, y)]
+            self.assertEquals((neighbours.count(BoardState.HIDDEN),
+                               neighbours.count(BoardState.FLAG)),
+                              (bs.count_hidden_neighbours(x, y),
+                               bs.count_flagged_neighbours(x, y)))
+
+    def test_hidden_cells_is_live_and_read_only(self):
+        bs = self._create_boardstate(3, 3)
+        hidden_cells = bs.hidden_cells
+        bs.set(1, 1, BoardState.FLAG)
+        self.assertEquals((False, False), ((1, 1) in hidden_cells, hasattr(hidden_cells, 'add')))
+
+    def test_hidden_cells_after_reset_tracks_new_game(self):
+        bs = self._create_boardstate(3, 3)
+        hidden_cells = bs.hidden_cells
+        bs.set(1, 1, BoardState.FLAG)
+        bs.reset()
+        self.assertIn((1, 1), hidden_cells)
 
     def test_set(self):
         bs = self._create_boardstate()
@@ -212,15 +281,38 @@ class TestBoardState(TestCase):
 
     def test_clamp_pos_outside_bottom_right_returns_bottom_right_corner(self):
         bs = self._create_boardstate()
-        clamped_pos = bs.clamp_pos((9, 9))
+        clamped_pos = bs.clamp_pos(9, 9)
         self.assertEquals((3, 3), clamped_pos)
 
     def test_clamp_pos_outside_top_left_returns_top_left_corner(self):
         bs = self._create_boardstate()
-        clamped_pos = bs.clamp_pos((-9, -9))
+        clamped_pos = bs.clamp_pos(-9, -9)
         self.assertEquals((0, 0), clamped_pos)
 
 
+class TestMineSweeperAI(TestCase):
+    def test_next_definite_safe_cell_reveals_it_and_stops_evaluating(self):
+        ms = MineSweeper(4, 4, 1)
+        ms.board.set(0, 0, BoardState.FLAG)
+        ms.board.set(1, 0, 1)  # Its only mine is flagged, so its hidden neighbours are safe.
+        ai = MineSweeperAI(ms)
+        ai.THINK_DELAY = 0
+        evaluated = []
+        calc_risk = ai._calc_risk
+
+        def record_calc_risk(x, y, general_prob):
+            evaluated.append(calc_risk(x, y, general_prob))
+            return evaluated[-1]
+        ai._calc_risk = record_calc_risk
+
+        command = next(ai)
+        last = evaluated[-1]
+        self.assertIn(command.pos, [(0, 1), (1, 1), (2, 0), (2, 1)])
+        self.assertEquals((CmdType.REVEAL, command.pos, 0.0),
+                          (command.type, (last.x, last.y), last.risk))
+        self.assertTrue(all(r.risk > 0.0 for r in evaluated[:-1]))
+
+
 class TestCommand(TestCase):
     def test_pos(self):
         command = Command(CmdType.REVEAL, 17, 19)
@@ -232,6 +324,22 @@ class TestMineSweeperModule(TestCase):
         command = map_key_to_command(CmdKey.REVEAL_KEY, 0, 0)
         self.assertEquals(Command(CmdType.REVEAL, 0, 0), command)
 
+    def test_map_key_to_command_movement_key(self):
+        command = map_key_to_command(CmdKey.J_KEY, 2, 3)
+        self.assertEquals(Command(CmdType.DOWN, 2, 3), command)
+
+    def test_map_key_to_command_unmapped_key_returns_none_command(self):
+        command = map_key_to_command(ord('z'), 2, 3)
+        self.assertEquals(CmdType.NONE, command.type)
+
     def test_map_cell_state_to_renderable(self):
         renderable = map_cell_state_to_renderable(BoardState.HIDDEN)
         self.assertEquals(Strings.HIDDEN_CELL, renderable)
+
+    def test_map_cell_state_to_renderable_mine_count(self):
+        renderable = map_cell_state_to_renderable(3)
+        self.assertEquals('3', renderable)
+
+    def test_map_cell_state_to_renderable_invalid_state(self):
+        renderable = map_cell_state_to_renderable(99)
+        self.assertEquals(Strings.INVALID_CELL, renderable)